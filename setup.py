@@ -12,7 +12,7 @@ def parse_requirements(filename):
     with open(filename, mode="r", encoding="utf-8") as fh:
         lines = []
         for line in fh:
-            line.strip()
+            line = line.strip()
             if line and not line.startswith("#"):
                 lines.append(line)
     return lines
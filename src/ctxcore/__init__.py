@@ -2,9 +2,14 @@
 Core functions for pycisTarget and the SCENIC tool suite
 """
 
-from pkg_resources import DistributionNotFound, get_distribution
+import sys
+
+if sys.version_info >= (3, 8):
+    from importlib.metadata import PackageNotFoundError, version
+else:
+    from importlib_metadata import PackageNotFoundError, version  # pragma: no cover
 
 try:
-    __version__ = get_distribution("ctxcore").version
-except DistributionNotFound:
+    __version__ = version("ctxcore")
+except PackageNotFoundError:
     pass
@@ -25,6 +25,11 @@ from ctxcore.datatypes import (
     ScoresOrRankingsType,
 )
 
+# Minimum number of region IDs or gene IDs columns to read or convert before the pyarrow thread pool is used.
+# pyarrow dispatches one task per column when reading or converting to pandas with threads, so for a handful of
+# columns (e.g. a small gene signature) the thread pool has little to parallelize over and only adds dispatch overhead.
+MIN_COLUMNS_FOR_PYARROW_THREADS = 64
+
 
 def is_feather_v1_or_v2(feather_filename: Union[Path, str]) -> Optional[int]:
     """
@@ -192,50 +197,50 @@ class CisTargetDatabase:
             column_names = list(schema.keys())
             dtypes = list(schema.values())
 
-        index_column_idx: Optional[int] = None
-        index_column_name: Optional[str] = None
-
-        # Get database index column ("motifs", "tracks", "regions" or "genes" depending of the database type).
-        # Start with the last column (as the index column normally should be the latest).
-        for column_idx, column_name in zip(
-            range(len(column_names) - 1, -1, -1), column_names[::-1]
-        ):
-            if column_name in {"motifs", "tracks", "regions", "genes"}:
-                index_column_idx = column_idx
-                index_column_name = column_name
-
-                if use_pyarrow:
-                    row_names = (
-                        pf.read_table(
-                            source=ct_db_filename,
-                            columns=[column_idx],
-                            memory_map=False,
-                            use_threads=False,
-                        )
-                        .column(0)
-                        .to_pylist()
-                    )
-                else:
-                    import polars as pl
-
-                    row_names = (
-                        pl.read_ipc(
-                            file=ct_db_filename,
-                            columns=[column_idx],
-                            use_pyarrow=False,
-                            rechunk=False,
-                        )
-                        .to_series()
-                        .to_list()
-                    )
-                break
+        # Get database index column ("motifs", "tracks", "regions" or "genes" depending of the database type) from the
+        # schema. Start with the last column (as the index column normally should be the latest).
+        index_column_idx: Optional[int] = next(
+            (
+                column_idx
+                for column_idx in range(len(column_names) - 1, -1, -1)
+                if column_names[column_idx] in {"motifs", "tracks", "regions", "genes"}
+            ),
+            None,
+        )
 
-        if not index_column_name or not index_column_idx:
+        if index_column_idx is None:
             raise ValueError(
-                '"{ct_db_filename}" is not a cisTarget database file as it does not contain a "motifs", "tracks", '
+                f'"{ct_db_filename}" is not a cisTarget database file as it does not contain a "motifs", "tracks", '
                 '"regions" or "genes" column.'
             )
 
+        index_column_name = column_names[index_column_idx]
+
+        if use_pyarrow:
+            row_names = (
+                pf.read_table(
+                    source=ct_db_filename,
+                    columns=[index_column_idx],
+                    memory_map=True,
+                    use_threads=False,
+                )
+                .column(0)
+                .to_pylist()
+            )
+        else:
+            import polars as pl
+
+            row_names = (
+                pl.read_ipc(
+                    file=ct_db_filename,
+                    columns=[index_column_idx],
+                    use_pyarrow=False,
+                    rechunk=False,
+                )
+                .to_series()
+                .to_list()
+            )
+
         # Get all column names without index column name.
         column_names = (
             column_names[0:index_column_idx] + column_names[index_column_idx + 1 :]
@@ -252,12 +257,15 @@ class CisTargetDatabase:
             )
 
         column_dtype = column_dtype[0]
-        dtype: Union[Type[np.int16], Type[np.int32], Type[np.float32]]
+        dtype: Union[Type[np.int16], Type[np.uint16], Type[np.int32], Type[np.float32]]
 
         if use_pyarrow:
             if column_dtype == pa.int16():
                 scores_or_rankings = "rankings"
                 dtype = np.int16
+            elif column_dtype == pa.uint16():
+                scores_or_rankings = "rankings"
+                dtype = np.uint16
             elif column_dtype == pa.int32():
                 scores_or_rankings = "rankings"
                 dtype = np.int32
@@ -274,6 +282,9 @@ class CisTargetDatabase:
             if column_dtype == pl.Int16:
                 scores_or_rankings = "rankings"
                 dtype = np.int16
+            elif column_dtype == pl.UInt16:
+                scores_or_rankings = "rankings"
+                dtype = np.uint16
             elif column_dtype == pl.Int32:
                 scores_or_rankings = "rankings"
                 dtype = np.int32
@@ -341,7 +352,7 @@ class CisTargetDatabase:
         region_or_gene_ids: RegionOrGeneIDs,
         motif_or_track_ids: MotifOrTrackIDs,
         scores_or_rankings: ScoresOrRankingsType,
-        dtype: Type[Union[np.int16, np.int32, np.float32]],
+        dtype: Type[Union[np.int16, np.uint16, np.int32, np.float32]],
         engine: Union[
             str, Literal["polars"], Literal["polars_pyarrow"], Literal["pyarrow"]
         ] = "polars",
@@ -357,7 +368,7 @@ class CisTargetDatabase:
         self.all_region_or_gene_ids: RegionOrGeneIDs = region_or_gene_ids
         self.all_motif_or_track_ids: MotifOrTrackIDs = motif_or_track_ids
         self.scores_or_rankings: ScoresOrRankingsType = scores_or_rankings
-        self.dtype: Type[Union[np.int16, np.int32, np.float32]] = dtype
+        self.dtype: Type[Union[np.int16, np.uint16, np.int32, np.float32]] = dtype
         self.engine = engine
 
         # Count number of region IDs or gene IDs.
@@ -377,6 +388,10 @@ class CisTargetDatabase:
         # Keep track for which region IDs or gene IDs, scores or rankings are loaded with cisTargetDatabase.prefetch().
         self.region_or_gene_ids_loaded: Optional[RegionOrGeneIDs] = None
 
+        # Pyarrow Table (self.df_cached at the time it was created) and numpy array with for each region ID or gene ID
+        # in self.all_region_or_gene_ids the position of its column in that pyarrow Table (-1 if it was not loaded).
+        self._df_cached_column_idx: Optional[Tuple[pa.Table, np.ndarray]] = None
+
     def __str__(self) -> str:
         all_regions_or_gene_ids_formatted = "\n    ".join(
             str(self.all_region_or_gene_ids).split("\n")
@@ -408,6 +423,16 @@ class CisTargetDatabase:
             ")"
         )
 
+    def __getstate__(self) -> dict:
+        # Do not pickle prefetched scores or rankings (e.g. when sending the object to other processes), as they are
+        # memory mapped from the cisTarget database file and would be copied completely. They are lazily read again
+        # from the cisTarget database file by prefetch() when needed.
+        state = self.__dict__.copy()
+        state["df_cached"] = None
+        state["region_or_gene_ids_loaded"] = None
+        state["_df_cached_column_idx"] = None
+        return state
+
     @property
     def is_genes_db(self) -> bool:
         """
@@ -486,6 +511,16 @@ class CisTargetDatabase:
                 region_or_gene_ids.difference(self.all_region_or_gene_ids),
             )
 
+    @staticmethod
+    def _use_pyarrow_threads(nbr_region_or_gene_ids: int) -> bool:
+        """
+        Check if it is worth to use the pyarrow thread pool to read or convert scores or rankings.
+
+        :param nbr_region_or_gene_ids: Number of region IDs or gene IDs columns to read or convert.
+        :return: True if the pyarrow thread pool should be used.
+        """
+        return nbr_region_or_gene_ids >= MIN_COLUMNS_FOR_PYARROW_THREADS
+
     def clear_cache(self):
         """
         Remove prefetched scores or regions for region IDs or gene IDs from memory.
@@ -493,6 +528,7 @@ class CisTargetDatabase:
 
         self.df_cached = None
         self.region_or_gene_ids_loaded = None
+        self._df_cached_column_idx = None
 
     def _prefetch_as_polars_dataframe(
         self, region_or_gene_ids: RegionOrGeneIDs, use_pyarrow: bool, sort: bool = False
@@ -623,7 +659,8 @@ class CisTargetDatabase:
             # No region IDs or gene IDs scores/rankings where loaded before or cached version was a polars DataFrame.
 
             # Get all found region IDs or gene IDs columns with scores/rankings and "motifs" or "track" column from
-            # cisTarget Feather file as a pyarrow Table.
+            # cisTarget Feather file as a pyarrow Table. The file is memory mapped, so only the pages of the requested
+            # columns are read (uncompressed columns are not even copied) and repeated reads hit the page cache.
             self.df_cached = pf.read_table(
                 source=self.ct_db_filename,
                 columns=(
@@ -632,8 +669,8 @@ class CisTargetDatabase:
                     else found_region_or_gene_ids.ids
                 )
                 + (self.all_motif_or_track_ids.type.value,),
-                memory_map=False,
-                use_threads=True,
+                memory_map=True,
+                use_threads=self._use_pyarrow_threads(len(found_region_or_gene_ids)),
             )
 
             # Keep track of loaded region IDs or gene IDs scores/rankings.
@@ -658,16 +695,22 @@ class CisTargetDatabase:
                 pa_table_subset = pf.read_table(
                     source=self.ct_db_filename,
                     columns=region_or_gene_ids_to_load.ids,
-                    memory_map=False,
-                    use_threads=True,
+                    memory_map=True,
+                    use_threads=self._use_pyarrow_threads(
+                        len(region_or_gene_ids_to_load)
+                    ),
                 )
 
-                # Get current loaded pyarrow Table to which the pa_table_subset data will be added.
-                pa_table = self.df_cached
-
-                for column in pa_table_subset.itercolumns():
-                    # Append column with region IDs or gene IDs scores/rankings to existing pyarrow Table.
-                    pa_table = pa_table.append_column(column._name, column)
+                # Add columns with region IDs or gene IDs scores/rankings to the current loaded pyarrow Table at once,
+                # instead of creating a new pyarrow Table for each appended column. Keep the schema metadata of the
+                # current loaded pyarrow Table (e.g. pandas metadata), like append_column() does.
+                pa_table = pa.Table.from_arrays(
+                    self.df_cached.columns + pa_table_subset.columns,
+                    schema=pa.schema(
+                        list(self.df_cached.schema) + list(pa_table_subset.schema),
+                        metadata=self.df_cached.schema.metadata,
+                    ),
+                )
 
                 # Keep track of loaded region IDs or gene IDs scores/rankings.
                 self.region_or_gene_ids_loaded = found_region_or_gene_ids.union(
@@ -744,6 +787,79 @@ class CisTargetDatabase:
                 f'Unsupported engine "{engine}" for reading cisTarget database.'
             )
 
+    def subset_to_numpy(
+        self,
+        region_or_gene_ids: RegionOrGeneIDs,
+        engine: Optional[
+            Union[str, Literal["polars"], Literal["polars_pyarrow"], Literal["pyarrow"]]
+        ] = None,
+    ) -> np.ndarray:
+        """
+        Create numpy array of scores or rankings for input region IDs or gene IDs from cisTarget database file.
+
+        Same as `subset_to_pandas()`, but without the pandas DataFrame around the scores or rankings for callers
+        which only need the (n_motifs_or_tracks, n_region_or_gene_ids) matrix. Rows follow the order of
+        self.all_motif_or_track_ids and columns follow the order of the input region IDs or gene IDs.
+
+        :param region_or_gene_ids:
+            Input region IDs or gene IDs to load from the cisTarget database file.
+        :param engine:
+            Engine to use when reading from cisTarget Feather database file:
+              - `polars`: Use `pl.read_ipc(..., use_pyarrow=False)` to read to Polars dataframe.
+              - `polars_pyarrow`: Use `pl.read_ipc(..., use_pyarrow=True)` to read to Polars dataframe.
+              - `pyarrow`: Use `pyarrow.feather.read_table()` to read to pyarrow Table.
+              - `None`: Use engine defined by `self.engine`.
+        :return: C-contiguous numpy array with scores or rankings.
+        """
+
+        (
+            contains_all_input_gene_ids_or_regions_ids,
+            found_region_or_gene_ids,
+            not_found_region_or_gene_ids,
+        ) = self.has_all_region_or_gene_ids(region_or_gene_ids)
+
+        if contains_all_input_gene_ids_or_regions_ids is False:
+            raise ValueError(
+                f"Not all provided {self.all_region_or_gene_ids.type} are found: {not_found_region_or_gene_ids}"
+            )
+
+        engine = engine if engine else self.engine
+
+        # Fetch scores or rankings for input region IDs or gene IDs from cisTarget database file for region IDs or
+        # gene IDs which were not prefetched in previous calls.
+        self.prefetch(region_or_gene_ids=region_or_gene_ids, engine=engine, sort=True)
+
+        if not self.df_cached:
+            raise RuntimeError(
+                f"Prefetch failed to retrieve {self.scores_or_rankings} for "
+                f"{region_or_gene_ids} from cisTarget database "
+                f'"{self.ct_db_filename}".'
+            )
+
+        if engine == "pyarrow":
+            # Copy each region ID or gene ID column (a view on the Arrow buffer) straight into a preallocated array,
+            # so the data is only copied once.
+            scores_or_rankings = np.empty(
+                shape=(
+                    self.nbr_total_motif_or_track_ids,
+                    len(found_region_or_gene_ids),
+                ),
+                dtype=self.dtype,
+            )
+
+            for column_idx, region_or_gene_id in enumerate(
+                found_region_or_gene_ids.ids
+            ):
+                scores_or_rankings[:, column_idx] = self.df_cached.column(
+                    region_or_gene_id
+                ).to_numpy()
+
+            return scores_or_rankings
+        else:
+            return np.ascontiguousarray(
+                self.df_cached.select(found_region_or_gene_ids.ids).to_numpy()
+            )
+
     def subset_to_pandas(
         self,
         region_or_gene_ids: RegionOrGeneIDs,
@@ -796,24 +912,26 @@ class CisTargetDatabase:
             )
 
         if engine == "pyarrow":
-            # Select input region IDs or gene IDs subset and motif or track column from pyarrow Table and convert to
-            # pandas DataFrame.
-            pd_df = pd.DataFrame(
-                data=self.df_cached.select(
-                    # Region IDs or gene IDs columns.
-                    found_region_or_gene_ids.ids
-                    # motifs or track column.
-                    + (("motifs",) if self.is_motifs_db else ("tracks",))
-                ).to_pandas()
+            # Select input region IDs or gene IDs subset from pyarrow Table and convert to pandas DataFrame:
+            #   - split_blocks and self_destruct are not used: zero-copy column blocks would be read-only views of
+            #     the (memory mapped) Arrow buffers, while callers expect a writable DataFrame. The scores or
+            #     rankings are copied once in a single newly allocated (writable) block instead.
+            #   - use_threads: convert columns in parallel on the pyarrow CPU thread pool (size can be changed with
+            #     `pa.set_cpu_count()`), but only when enough data needs to be converted.
+            pd_df = self.df_cached.select(found_region_or_gene_ids.ids).to_pandas(
+                use_threads=self._use_pyarrow_threads(len(found_region_or_gene_ids)),
             )
 
-            # Set motifs or tracks column as index (inplace to avoid extra copy).
-            pd_df.set_index("motifs" if self.is_motifs_db else "tracks", inplace=True)
+            # Assign motifs or tracks as index directly (the motif or track column was already read when creating
+            # the cisTarget database object), instead of converting the motif or track column too and calling
+            # set_index() on it, which consolidates (copies) all column blocks.
+            pd_df.index = pd.Index(
+                self.all_motif_or_track_ids.ids,
+                name="motifs" if self.is_motifs_db else "tracks",
+            )
 
             # Add "regions" or "genes" as column index name.
-            pd_df.rename_axis(
-                columns="regions" if self.is_regions_db else "genes", inplace=True
-            )
+            pd_df.columns.name = "regions" if self.is_regions_db else "genes"
 
             return pd_df
         else:
@@ -830,3 +948,172 @@ class CisTargetDatabase:
                     name="motifs" if self.is_motifs_db else "tracks",
                 ),
             )
+
+
+    def _get_df_cached_column_idx(self) -> np.ndarray:
+        """
+        Get for each region ID or gene ID in self.all_region_or_gene_ids the position of its column in the pyarrow
+        Table with prefetched scores or rankings (self.df_cached) or -1 if it was not prefetched.
+
+        :return: numpy array with column positions in self.df_cached.
+        """
+        if (
+            self._df_cached_column_idx is None
+            or self._df_cached_column_idx[0] is not self.df_cached
+        ):
+            # Prefetched region IDs or gene IDs changed since last call.
+            df_cached_column_idx = np.full(
+                self.nbr_total_region_or_gene_ids, -1, dtype=np.int64
+            )
+
+            for column_idx, column_name in enumerate(self.df_cached.column_names):
+                region_or_gene_idx = self.all_region_or_gene_ids.ids_dict.get(
+                    column_name
+                )
+                if region_or_gene_idx is not None:
+                    df_cached_column_idx[region_or_gene_idx] = column_idx
+
+            self._df_cached_column_idx = (self.df_cached, df_cached_column_idx)
+
+        return self._df_cached_column_idx[1]
+
+    def subset_to_pandas_by_idx(self, region_or_gene_idx: np.ndarray) -> pd.DataFrame:
+        """
+        Create Pandas dataframe of scores or rankings for the region IDs or gene IDs at the input positions in
+        self.all_region_or_gene_ids.
+
+        Same as `subset_to_pandas()`, but the positions are mapped directly to columns of the pyarrow Table with
+        prefetched scores or rankings (self.df_cached), so no region IDs or gene IDs need to be looked up when they
+        were prefetched before. Only region IDs or gene IDs which were not prefetched yet, are prefetched by name.
+
+        :param region_or_gene_idx:
+            Positions of the region IDs or gene IDs in self.all_region_or_gene_ids. The caller is responsible for
+            passing unique positions between 0 and self.nbr_total_region_or_gene_ids - 1.
+        :return: pandas DataFrame with the region IDs or gene IDs in the order of the input positions.
+        """
+        region_or_gene_idx = np.asarray(region_or_gene_idx, dtype=np.int64)
+        region_or_gene_ids = [
+            self.all_region_or_gene_ids.ids[idx] for idx in region_or_gene_idx
+        ]
+
+        if self.engine != "pyarrow":
+            # Only a pyarrow Table as cache can be indexed by column position.
+            return self.subset_to_pandas(
+                region_or_gene_ids=RegionOrGeneIDs(
+                    region_or_gene_ids=region_or_gene_ids,
+                    regions_or_genes_type=self.all_region_or_gene_ids.type,
+                )
+            )
+
+        regions_or_genes_column_index = pd.Index(
+            region_or_gene_ids,
+            name="regions" if self.is_regions_db else "genes",
+        )
+        motifs_or_tracks_index = pd.Index(
+            self.all_motif_or_track_ids.ids,
+            name="motifs" if self.is_motifs_db else "tracks",
+        )
+
+        if len(region_or_gene_ids) == 0:
+            return pd.DataFrame(
+                index=motifs_or_tracks_index,
+                columns=regions_or_genes_column_index,
+                dtype=self.dtype,
+            )
+
+        if self.df_cached is not None:
+            region_or_gene_idx_to_load = region_or_gene_idx[
+                self._get_df_cached_column_idx()[region_or_gene_idx] == -1
+            ]
+        else:
+            region_or_gene_idx_to_load = region_or_gene_idx
+
+        if len(region_or_gene_idx_to_load) != 0:
+            # Fetch scores or rankings for region IDs or gene IDs which were not prefetched in previous calls.
+            self.prefetch(
+                region_or_gene_ids=RegionOrGeneIDs(
+                    region_or_gene_ids=[
+                        self.all_region_or_gene_ids.ids[idx]
+                        for idx in region_or_gene_idx_to_load
+                    ],
+                    regions_or_genes_type=self.all_region_or_gene_ids.type,
+                ),
+                engine="pyarrow",
+            )
+
+        pd_df = self.df_cached.select(
+            self._get_df_cached_column_idx()[region_or_gene_idx].tolist()
+        ).to_pandas(use_threads=self._use_pyarrow_threads(len(region_or_gene_idx)))
+
+        pd_df.index = motifs_or_tracks_index
+        pd_df.columns = regions_or_genes_column_index
+
+        return pd_df
+
+def write_ct_db_rankings_as_uint16(
+    ct_db_filename_in: Union[Path, str],
+    ct_db_filename_out: Union[Path, str],
+    compression: Union[
+        str, Literal["zstd"], Literal["lz4"], Literal["uncompressed"]
+    ] = "zstd",
+) -> None:
+    """
+    Write a cisTarget rankings database with the rankings stored as uint16 instead of int32.
+
+    Rankings are 0-based and never exceed the number of region IDs or gene IDs, so for databases with up to 65536
+    region IDs or gene IDs, uint16 can be used to halve the size of the rankings on disk and in memory
+    (int16 only allows up to 32768 region IDs or gene IDs).
+
+    :param ct_db_filename_in:
+        Path to cisTarget Feather rankings database.
+    :param ct_db_filename_out:
+        Path to output cisTarget Feather rankings database with uint16 rankings.
+    :param compression:
+        Compression for the output Feather file: "zstd", "lz4" or "uncompressed".
+    """
+
+    # Check if output filename follows the cisTarget database naming convention, so it can be read again.
+    if get_ct_db_type_from_ct_db_filename(ct_db_filename_out)[0] != "rankings":
+        raise ValueError(
+            f'cisTarget database filename "{ct_db_filename_out}" should end with ".rankings.feather".'
+        )
+
+    ct_db = CisTargetDatabase.init_ct_db(
+        ct_db_filename=ct_db_filename_in, engine="pyarrow"
+    )
+
+    if not ct_db.is_rankings_db:
+        raise ValueError(
+            f'cisTarget database "{ct_db_filename_in}" does not contain rankings.'
+        )
+
+    if ct_db.nbr_total_region_or_gene_ids > np.iinfo(np.uint16).max + 1:
+        raise ValueError(
+            f'cisTarget database "{ct_db_filename_in}" contains too many {ct_db.all_region_or_gene_ids.type.value} '
+            f"({ct_db.nbr_total_region_or_gene_ids}) to store their rankings as uint16."
+        )
+
+    # Do not memory map the input: uncasted columns would still point into the input file, which would crash
+    # write_feather() when it truncates that file in case the input and output filename are the same.
+    pa_table = pf.read_table(source=ct_db_filename_in, memory_map=False)
+
+    # Cast all region IDs or gene IDs columns to uint16 and keep the motifs or tracks column as is.
+    motifs_or_tracks_column_name = ct_db.all_motif_or_track_ids.type.value
+    pa_table = pa_table.cast(
+        pa.schema(
+            [
+                field
+                if field.name == motifs_or_tracks_column_name
+                else field.with_type(pa.uint16())
+                for field in pa_table.schema
+            ],
+            metadata=pa_table.schema.metadata,
+        )
+    )
+
+    pf.write_feather(
+        df=pa_table,
+        dest=ct_db_filename_out,
+        compression=compression,
+        version=2,
+    )
@@ -181,6 +181,15 @@ class GeneSignature(yaml.YAMLObject):
             map(first, sorted(self.gene2weight.items(), key=second, reverse=True))
         )
 
+    @property
+    @memoize
+    def genes_set(self) -> FrozenSet[str]:
+        """
+        Return genes in this signature as a set, so membership tests and intersections with the genes of e.g. a
+        database do not need to build a new set each time.
+        """
+        return frozenset(self.gene2weight.keys())
+
     @property
     @memoize
     def weights(self) -> Tuple[float, ...]:
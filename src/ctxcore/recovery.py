@@ -316,7 +316,7 @@ def auc1d(ranking: np.ndarray, rank_cutoff: int, max_auc: float) -> int:
     return np.sum(np.diff(x) * y) / max_auc
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def weighted_auc1d(
     ranking: np.ndarray, weights: np.ndarray, rank_cutoff: int, max_auc: float
 ) -> np.ndarray:
@@ -340,6 +340,11 @@ def weighted_auc1d(
     return np.sum(np.diff(x) * y) / max_auc
 
 
+# Compiled as a whole (instead of only calling the compiled weighted_auc1d from a Python loop) and without holding the
+# GIL, so AUCs for different databases can be calculated from multiple threads at the same time. parallel=True is not
+# used as it makes compilation a lot slower and would oversubscribe the CPUs when multiple databases are processed in
+# parallel already.
+@jit(nopython=True, nogil=True)
 def auc2d(
     rankings: np.ndarray, weights: np.ndarray, rank_cutoff: int, max_auc: float
 ) -> np.ndarray:
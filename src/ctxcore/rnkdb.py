@@ -2,10 +2,11 @@
 
 import os
 from abc import ABCMeta, abstractmethod
-from typing import Set, Tuple
+from typing import FrozenSet, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from cytoolz import memoize
+import pyarrow.feather as pf
 
 from ctxcore.ctdb import CisTargetDatabase
 from ctxcore.datatypes import RegionOrGeneIDs
@@ -20,6 +21,8 @@ class RankingDatabase(metaclass=ABCMeta):
     The rankings of the genes are 0-based.
     """
 
+    __slots__ = ("_name", "_geneset")
+
     def __init__(self, name: str):
         """
         Create a new instance.
@@ -29,6 +32,7 @@ class RankingDatabase(metaclass=ABCMeta):
         assert name, "Name must be specified."
 
         self._name = name
+        self._geneset: Optional[FrozenSet[str]] = None
 
     @property
     def name(self) -> str:
@@ -47,19 +51,20 @@ class RankingDatabase(metaclass=ABCMeta):
 
     @property
     @abstractmethod
-    def genes(self) -> Tuple[str]:
+    def genes(self) -> Tuple[str, ...]:
         """
         List of genes ranked according to the regulatory features in this database.
         """
         pass
 
     @property
-    @memoize
-    def geneset(self) -> Set[str]:
+    def geneset(self) -> FrozenSet[str]:
         """
         Set of genes ranked according to the regulatory features in this database.
         """
-        return set(self.genes)
+        if self._geneset is None:
+            self._geneset = frozenset(self.genes)
+        return self._geneset
 
     @abstractmethod
     def load_full(self) -> pd.DataFrame:
@@ -94,6 +99,8 @@ class RankingDatabase(metaclass=ABCMeta):
 
 
 class FeatherRankingDatabase(RankingDatabase):
+    __slots__ = ("_fname", "ct_db", "_genes", "_genes2idx", "_total_genes")
+
     def __init__(self, fname: str, name: str):
         """
         Create a new feather database.
@@ -110,42 +117,118 @@ class FeatherRankingDatabase(RankingDatabase):
             ct_db_filename=self._fname, engine="pyarrow"
         )
 
+        # Gene IDs and their position in the database are already parsed from the Feather schema by
+        # CisTargetDatabase, so keep a reference to them instead of recalculating them on each access.
+        self._genes = self.ct_db.all_region_or_gene_ids.ids
+        self._genes2idx = self.ct_db.all_region_or_gene_ids.ids_dict
+        self._total_genes = self.ct_db.nbr_total_region_or_gene_ids
+
     @property
-    @memoize
     def total_genes(self) -> int:
-        return self.ct_db.nbr_total_region_or_gene_ids
+        return self._total_genes
 
     @property
-    @memoize
-    def genes(self) -> Tuple[str]:
-        return self.ct_db.all_region_or_gene_ids.ids
+    def genes(self) -> Tuple[str, ...]:
+        return self._genes
 
     def load_full(self) -> pd.DataFrame:
         return self.ct_db.subset_to_pandas(
             region_or_gene_ids=self.ct_db.all_region_or_gene_ids
         )
 
-    def load(self, gs: GeneSignature) -> pd.DataFrame:
+    def resolve(self, gs: GeneSignature) -> np.ndarray:
+        """
+        Get the positions of the genes in the supplied signature which are ranked in this database.
+
+        The positions can be passed to :meth:`load_by_indices` of this database or of other databases which rank
+        exactly the same genes in the same order, so the signature only needs to be resolved once.
+
+        :param gs: The gene signature.
+        :return: The sorted positions of the genes.
+        """
         # For some genes in the signature there might not be a rank available in the database.
-        gene_set = self.geneset.intersection(set(gs.genes))
+        # Intersect with the keys view of the gene to position mapping, so no set of all genes of the database needs
+        # to be created.
+        return np.array(
+            sorted(
+                self._genes2idx[gene] for gene in self._genes2idx.keys() & gs.genes_set
+            ),
+            dtype=np.int32,
+        )
 
-        return self.ct_db.subset_to_pandas(
-            region_or_gene_ids=RegionOrGeneIDs(
-                region_or_gene_ids=gene_set,
-                regions_or_genes_type=self.ct_db.all_region_or_gene_ids.type,
-            )
+    def _gene_ids(self, gs: GeneSignature) -> RegionOrGeneIDs:
+        """
+        Get the genes of the supplied signature which are ranked in this database.
+
+        :param gs: The gene signature.
+        :return: The genes in the same order as they appear in the database.
+        """
+        # For some genes in the signature there might not be a rank available in the database.
+        # Intersect with the keys view of the gene to position mapping, so no set of all genes of the database needs
+        # to be created.
+        gene_ids = sorted(
+            self._genes2idx.keys() & gs.genes_set, key=self._genes2idx.get
         )
 
+        return RegionOrGeneIDs(
+            region_or_gene_ids=gene_ids,
+            regions_or_genes_type=self.ct_db.all_region_or_gene_ids.type,
+        )
+
+    def load_by_indices(self, col_indices: np.ndarray) -> pd.DataFrame:
+        """
+        Load the ranking of the genes at the supplied positions (see :meth:`resolve`) for all features in this
+        database.
+
+        The positions are mapped directly to the columns of the already loaded rankings, so no gene lookups or set
+        operations are done for genes which were loaded before.
+
+        :param col_indices: The positions of the genes.
+        :return: a dataframe.
+        :raises ValueError: When positions are negative, out of range or not unique.
+        """
+        col_indices = np.asarray(col_indices)
+
+        if col_indices.size != 0:
+            if not np.issubdtype(col_indices.dtype, np.integer):
+                raise ValueError("Gene positions should be integers.")
+            if col_indices.min() < 0 or col_indices.max() >= self._total_genes:
+                raise ValueError(
+                    f"Gene positions should be between 0 and {self._total_genes - 1}."
+                )
+            if np.unique(col_indices).size != col_indices.size:
+                raise ValueError("Gene positions should be unique.")
+
+        return self.ct_db.subset_to_pandas_by_idx(region_or_gene_idx=col_indices)
+
+    def load(self, gs: GeneSignature) -> pd.DataFrame:
+        return self.ct_db.subset_to_pandas(region_or_gene_ids=self._gene_ids(gs))
+
+    def load_array(self, gs: GeneSignature) -> Tuple[Tuple[str, ...], np.ndarray]:
+        """
+        Load the ranking of the genes in the supplied signature for all features in this database as a numpy array.
+
+        :param gs: The gene signature.
+        :return: a tuple of the genes and a (n_features, n_genes) array with their rankings.
+        """
+        gene_ids = self._gene_ids(gs)
+
+        return gene_ids.ids, self.ct_db.subset_to_numpy(region_or_gene_ids=gene_ids)
+
 
 class MemoryDecorator(RankingDatabase):
     """
     A decorator for a ranking database which loads the entire database in memory.
     """
 
+    __slots__ = ("_db", "_df", "_col_pos")
+
     def __init__(self, db: RankingDatabase):
         assert db, "Database should be supplied."
         self._db = db
         self._df = db.load_full()
+        # Position of each gene column, so columns can be selected without scanning all genes on each load.
+        self._col_pos = {gene: idx for idx, gene in enumerate(self._df.columns)}
         super().__init__(db.name)
 
     @property
@@ -153,14 +236,20 @@ class MemoryDecorator(RankingDatabase):
         return self._db.total_genes
 
     @property
-    def genes(self) -> Tuple[str]:
+    def genes(self) -> Tuple[str, ...]:
         return self._db.genes
 
+    @property
+    def geneset(self) -> FrozenSet[str]:
+        return self._db.geneset
+
     def load_full(self) -> pd.DataFrame:
         return self._df
 
     def load(self, gs: GeneSignature) -> pd.DataFrame:
-        return self._df.loc[:, self._df.columns.isin(gs.genes)]
+        return self._df.iloc[
+            :, sorted(self._col_pos[gene] for gene in gs.genes if gene in self._col_pos)
+        ]
 
 
 def opendb(fname: str, name: str) -> RankingDatabase:
@@ -180,3 +269,36 @@ def opendb(fname: str, name: str) -> RankingDatabase:
         return FeatherRankingDatabase(fname, name=name)
     else:
         raise ValueError(f'"{extension}" is an unknown extension.')
+
+
+def recompress(
+    fname_in: str,
+    fname_out: str,
+    compression: str = "lz4",
+    compression_level: Optional[int] = None,
+    chunksize: int = 65536,
+) -> None:
+    """
+    Rewrite a ranking database as a compressed Feather v2 file.
+
+    Feather v1 databases are converted to Feather v2. Compressed databases are transparently decompressed when read.
+    The database can be rewritten in place (fname_in and fname_out can be the same).
+
+    :param fname_in: The filename of the database.
+    :param fname_out: The filename of the compressed database.
+    :param compression: The compression codec: "lz4", "zstd" or "uncompressed".
+    :param compression_level: The compression level (None uses the default level of the codec).
+    :param chunksize: The number of rows per record batch.
+    """
+    assert os.path.isfile(fname_in), f'"{fname_in}" does not exist.'
+
+    # Do not memory map the input: for uncompressed databases the table would point into the input file, which
+    # would crash write_feather() when it truncates that file in case fname_in and fname_out are the same.
+    pf.write_feather(
+        df=pf.read_table(source=fname_in, memory_map=False),
+        dest=fname_out,
+        compression=compression,
+        compression_level=compression_level,
+        chunksize=chunksize,
+        version=2,
+    )
@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import pickle
+
+import numpy as np
+import pyarrow.feather as pf
 import pytest
 from pkg_resources import resource_filename
 
+from ctxcore.ctdb import write_ct_db_rankings_as_uint16
 from ctxcore.genesig import GeneSignature
 from ctxcore.rnkdb import FeatherRankingDatabase as RankingDatabase
+from ctxcore.rnkdb import MemoryDecorator, recompress
 
 TEST_DATABASE_FNAME = resource_filename(
     'resources.tests',
@@ -32,6 +38,20 @@ def test_init(db):
     assert db.name == TEST_DATABASE_NAME
 
 
+def test_init_index_column_first(db, tmp_path):
+    fname = str(tmp_path / f"{TEST_DATABASE_NAME}.feather")
+    table = pf.read_table(TEST_DATABASE_FNAME)
+    pf.write_feather(table.select(["motifs"] + table.column_names[:-1]), fname)
+    assert RankingDatabase(fname, TEST_DATABASE_NAME).load_full().equals(db.load_full())
+
+
+def test_recompress_inplace(db, tmp_path):
+    fname = str(tmp_path / f"{TEST_DATABASE_NAME}.feather")
+    recompress(TEST_DATABASE_FNAME, fname, compression="uncompressed")
+    recompress(fname, fname, compression="zstd")
+    assert RankingDatabase(fname, TEST_DATABASE_NAME).load_full().equals(db.load_full())
+
+
 def test_total_genes(db):
     assert db.total_genes == 22284
 
@@ -40,13 +60,133 @@ def test_genes(db):
     assert len(db.genes) == 22284
 
 
+def test_geneset(db, gs):
+    assert db.geneset == set(db.genes)
+    assert isinstance(db.geneset, frozenset)
+    assert db.geneset is not db.ct_db.all_region_or_gene_ids.ids_set
+    assert len(db.load(gs).columns) == 29
+
+
 def test_load_full(db):
     rankings = db.load_full()
     assert len(rankings.index) == 5
     assert len(rankings.columns) == 22284
 
 
+def test_load_full_writable(db):
+    rankings = db.load_full()
+    rankings.iloc[0, 0] = 5
+    assert rankings.iloc[0, 0] == 5
+
+
 def test_load(db, gs):
     rankings = db.load(gs)
     assert len(rankings.index) == 5
     assert len(rankings.columns) == 29
+
+
+def test_pickle(db, gs):
+    rankings = db.load(gs)
+    db_unpickled = pickle.loads(pickle.dumps(db))
+    assert db_unpickled.ct_db.df_cached is None
+    assert db_unpickled.total_genes == 22284
+    assert rankings.equals(db_unpickled.load(gs))
+
+
+def test_load_array(db, gs):
+    genes, rankings = db.load_array(gs)
+    assert len(genes) == 29
+    assert rankings.shape == (5, 29)
+    assert rankings.flags.c_contiguous
+    df = db.load(gs)
+    assert list(genes) == list(df.columns)
+    assert (rankings == df.values).all()
+
+
+def test_write_ct_db_rankings_as_uint16(tmp_path):
+    fname = str(tmp_path / f"{TEST_DATABASE_NAME}.feather")
+    write_ct_db_rankings_as_uint16(TEST_DATABASE_FNAME, fname)
+    db_uint16 = RankingDatabase(fname, TEST_DATABASE_NAME)
+    assert db_uint16.ct_db.dtype == np.uint16
+    assert db_uint16.total_genes == 22284
+    assert (
+        db_uint16.load_full().values
+        == RankingDatabase(TEST_DATABASE_FNAME, TEST_DATABASE_NAME).load_full().values
+    ).all()
+
+
+def test_write_ct_db_rankings_as_uint16_inplace(db, tmp_path):
+    fname = str(tmp_path / f"{TEST_DATABASE_NAME}.feather")
+    pf.write_feather(
+        pf.read_table(TEST_DATABASE_FNAME), fname, compression="uncompressed"
+    )
+    write_ct_db_rankings_as_uint16(fname, fname, compression="uncompressed")
+    db_uint16 = RankingDatabase(fname, TEST_DATABASE_NAME)
+    assert db_uint16.ct_db.dtype == np.uint16
+    assert (db_uint16.load_full().values == db.load_full().values).all()
+
+
+def test_memory_decorator_load(db, gs):
+    rankings = MemoryDecorator(db).load(gs)
+    assert len(rankings.index) == 5
+    assert len(rankings.columns) == 29
+    assert rankings.equals(db.load(gs))
+
+
+def test_recompress(db, tmp_path):
+    fname = str(tmp_path / f"{TEST_DATABASE_NAME}.feather")
+    recompress(TEST_DATABASE_FNAME, fname, compression="zstd")
+    assert RankingDatabase(fname, TEST_DATABASE_NAME).load_full().equals(db.load_full())
+
+
+def test_resolve(db, gs):
+    col_indices = db.resolve(gs)
+    assert len(col_indices) == 29
+    assert (col_indices[:-1] < col_indices[1:]).all()
+
+
+def test_load_by_indices(db, gs):
+    rankings = db.load_by_indices(db.resolve(gs))
+    assert rankings.equals(db.load(gs))
+
+
+def test_load_by_indices_partially_loaded(db, gs):
+    db.load(gs.head(10))
+    rankings = db.load_by_indices(db.resolve(gs)[::-1])
+    assert rankings.equals(db.load(gs).iloc[:, ::-1])
+
+
+def test_load_by_indices_index_column_first(db, gs, tmp_path):
+    fname = str(tmp_path / f"{TEST_DATABASE_NAME}.feather")
+    table = pf.read_table(TEST_DATABASE_FNAME)
+    pf.write_feather(table.select(["motifs"] + table.column_names[:-1]), fname)
+    db_index_first = RankingDatabase(fname, TEST_DATABASE_NAME)
+    rankings = db_index_first.load_by_indices(db_index_first.resolve(gs))
+    assert rankings.equals(db.load(gs))
+
+
+def test_load_by_indices_empty(db):
+    rankings = db.load_by_indices(np.array([], dtype=np.int32))
+    assert rankings.shape == (len(db.ct_db.all_motif_or_track_ids), 0)
+
+
+@pytest.mark.parametrize("col_indices", [[-1], [22284], [0, 1, 1]])
+def test_load_by_indices_invalid(db, col_indices):
+    with pytest.raises(ValueError):
+        db.load_by_indices(np.array(col_indices))
+
+
+def test_load_writable(db, gs):
+    rankings = db.load(gs)
+    rankings.iloc[0, 0] = 5
+    assert rankings.iloc[0, 0] == 5
+
+
+def test_prefetch_keeps_schema_metadata(tmp_path, gs):
+    fname = str(tmp_path / f"{TEST_DATABASE_NAME}.feather")
+    table = pf.read_table(TEST_DATABASE_FNAME)
+    pf.write_feather(table.replace_schema_metadata({b"key": b"value"}), fname)
+    db_metadata = RankingDatabase(fname, TEST_DATABASE_NAME)
+    db_metadata.load(gs.head(10))
+    db_metadata.load(gs)
+    assert db_metadata.ct_db.df_cached.schema.metadata == {b"key": b"value"}
@@ -53,6 +53,11 @@ def test_genes():
     assert gs1.genes == ('SOX4', 'TP53')
 
 
+def test_genes_set():
+    gs1 = GeneSignature(name="test1", gene2weight={'TP53': 0.5, 'SOX4': 0.75})
+    assert gs1.genes_set == frozenset({'SOX4', 'TP53'})
+
+
 def test_dict():
     gs1 = GeneSignature(name="test1", gene2weight={'TP53': 0.5, 'SOX4': 0.75})
     assert gs1['TP53'] == 0.5
@@ -5,7 +5,7 @@ import pytest
 from pkg_resources import resource_filename
 
 from ctxcore.genesig import GeneSignature
-from ctxcore.recovery import auc1d
+from ctxcore.recovery import auc1d, auc2d
 from ctxcore.recovery import enrichment4features as enrichment
 from ctxcore.recovery import rcc2d, weighted_auc1d
 from ctxcore.rnkdb import FeatherRankingDatabase as RankingDatabase
@@ -119,3 +119,13 @@ def test_weighted_rcc2d_batch():
         assert rcc2d(rankings, np.insert(weights, len(weights), 0.0), total_genes)[
             :, :auc_rank_threshold
         ].sum(axis=1) == weighted_auc1d(ranking, weights, auc_rank_threshold, auc_max)
+
+
+def test_auc2d(db, gs):
+    genes, rankings = db.load_array(gs)
+    weights = np.asarray([gs[gene] for gene in genes])
+    aucs = auc2d(rankings, weights, 1000, 1000.0)
+    for row_idx in range(rankings.shape[0]):
+        assert aucs[row_idx] == weighted_auc1d(
+            rankings[row_idx, :], weights, 1000, 1000.0
+        )